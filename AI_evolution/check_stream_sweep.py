@@ -0,0 +1,112 @@
+# exercises Ctrl+C handling of the streaming sweep driver
+
+# Ctrl+C in a terminal signals the whole foreground process group, workers
+# included, so the driver is started in its own session and the signals are
+# sent with os.killpg. Checks that one Ctrl+C stops the sweep once, drains
+# the runs in flight and writes every published run to the csv, and that a
+# second Ctrl+C kills long runs right away without leaving workers behind.
+#
+# usage (from the repository root):
+#   python -m AI_evolution.check_stream_sweep
+
+# -----------------------------------------------------------------------------
+
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+
+num_workers = 2
+
+
+def start_sweep(tmp, num_iter):
+    out = os.path.join(tmp, f'out_{num_iter}.csv')
+    jsonl = os.path.join(tmp, f'progress_{num_iter}.jsonl')
+    proc = subprocess.Popen([sys.executable, '-m', 'AI_evolution.stream_sweep',
+                             out, '--jsonl', jsonl, '--num-iter', str(num_iter),
+                             '--replicates', '1', '--workers', str(num_workers)],
+                            stdout=subprocess.PIPE, text=True,
+                            start_new_session=True)
+    return proc, out, jsonl
+
+
+def count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def wait_for_runs(jsonl, n, timeout=60):
+    start = time.monotonic()
+    while count_lines(jsonl) < n:
+        assert time.monotonic() - start < timeout, 'no runs finished'
+        time.sleep(0.05)
+
+
+def assert_group_gone(pgid, timeout=5):
+    # the driver and all of its workers share the session's process group
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.05)
+    os.killpg(pgid, signal.SIGKILL)
+    raise AssertionError('workers left behind')
+
+
+def check_stop(tmp):
+    proc, out, jsonl = start_sweep(tmp, num_iter=200)
+    wait_for_runs(jsonl, 2)
+    os.killpg(proc.pid, signal.SIGINT)
+    stdout, _ = proc.communicate(timeout=30)
+    print(stdout, end='')
+    assert proc.returncode == 0, proc.returncode
+    # workers ignore the signal, so the parent hears it exactly once
+    assert stdout.count('stopping') == 1, stdout
+    assert 'aborting' not in stdout, stdout
+    # every published run is in the csv, and the sweep did stop early
+    ai_complex_df = pd.read_csv(out)
+    num_runs = ai_complex_df['sim_id'].nunique()
+    assert num_runs == count_lines(jsonl), (num_runs, count_lines(jsonl))
+    assert len(ai_complex_df) == num_runs * 200
+    assert_group_gone(proc.pid)
+
+
+def check_abort(tmp):
+    # long enough that draining the runs in flight would take many seconds
+    proc, out, jsonl = start_sweep(tmp, num_iter=2500)
+    wait_for_runs(jsonl, 1, timeout=120)
+    os.killpg(proc.pid, signal.SIGINT)
+    time.sleep(0.2)
+    start = time.monotonic()
+    os.killpg(proc.pid, signal.SIGINT)
+    stdout, _ = proc.communicate(timeout=30)
+    seconds = time.monotonic() - start
+    print(stdout, end='')
+    assert proc.returncode == 130, proc.returncode
+    assert stdout.count('stopping') == 1 and stdout.count('aborting') == 1, stdout
+    assert seconds < 3, seconds
+    # the runs finished before the abort are still written
+    ai_complex_df = pd.read_csv(out)
+    assert ai_complex_df['sim_id'].nunique() == count_lines(jsonl) >= 1
+    assert_group_gone(proc.pid)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_stop(tmp)
+        check_abort(tmp)
+    print('stream sweep ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# exercises the SQLite work queue with several local worker processes
+
+# Stands in for a multi-node sweep on one machine: a small sweep is queued,
+# "dead" workers claim tasks and never finish them, then several worker
+# processes drain the queue. Checks that expired leases are retried, that a
+# task losing its lease max_attempts times is marked failed, and that leases
+# shorter than a run are kept alive by the heartbeat. Finally a worker is
+# killed mid-run at the end of a sweep, and the remaining workers must wait
+# for its lease to expire and finish the task.
+#
+# usage (from the repository root):
+#   python -m AI_evolution.check_sweep_queue
+
+# -----------------------------------------------------------------------------
+
+import os
+import sqlite3
+import tempfile
+import time
+
+from multiprocessing import Process
+from AI_evolution import sweep_queue
+from AI_evolution.evolve_AI import sweep_parameters
+
+# -----------------------------------------------------------------------------
+
+num_workers = 4
+max_attempts = 2
+# shorter than one run, so runs only survive thanks to the heartbeat
+lease = 0.3
+num_iter = 1000
+
+
+def start_workers(db, n, prefix='node'):
+    workers = [Process(target=sweep_queue.work, args=(db,),
+                       kwargs={'worker': f'{prefix}-{k}', 'lease': lease,
+                               'max_attempts': max_attempts})
+               for k in range(n)]
+    for p in workers:
+        p.start()
+    return workers
+
+
+def read_attempts(db):
+    con = sqlite3.connect(db)
+    attempts = dict(con.execute('SELECT sim_id, attempts FROM tasks').fetchall())
+    con.close()
+    return attempts
+
+
+def check_expired_leases(tmp):
+    db = os.path.join(tmp, 'sweep.db')
+    all_pars = sweep_parameters(replicates=1)[:12]
+    assert sweep_queue.enqueue(db, all_pars, num_iter=num_iter) == len(all_pars)
+    # re-initialising does not duplicate tasks
+    assert sweep_queue.enqueue(db, all_pars, num_iter=num_iter) == 0
+
+    # dead workers: claim with a lease that has already run out
+    con = sweep_queue.connect(db)
+    first = sweep_queue.claim(con, 'dead-1', lease=-1, max_attempts=max_attempts)
+    again = sweep_queue.claim(con, 'dead-2', lease=-1, max_attempts=max_attempts)
+    assert first[0] == again[0] == 1
+    # task 1 has now lost its lease max_attempts times and is given up
+    second = sweep_queue.claim(con, 'dead-3', lease=-1, max_attempts=max_attempts)
+    assert second[0] == 2
+    counts = sweep_queue.status(db)
+    assert counts['failed'] == 1 and counts['expired'] == 1, counts
+    con.close()
+
+    for p in start_workers(db, num_workers):
+        p.join()
+        assert p.exitcode == 0
+
+    counts = sweep_queue.status(db)
+    print(counts)
+    assert counts == {'pending': 0, 'running': 0, 'done': len(all_pars) - 1,
+                      'failed': 1, 'expired': 0}, counts
+
+    attempts = read_attempts(db)
+    # task 2 was retried once, no healthy run was reclaimed
+    assert attempts[2] == 2, attempts
+    assert all(attempts[i] == 1 for i in attempts if i > 2), attempts
+
+    ai_complex_df = sweep_queue.collect(db)
+    assert len(ai_complex_df) == (len(all_pars) - 1) * num_iter
+    assert 1 not in set(ai_complex_df['sim_id'])
+
+
+def check_killed_worker(tmp):
+    db = os.path.join(tmp, 'killed.db')
+    all_pars = sweep_parameters(replicates=1)[:3]
+    sweep_queue.enqueue(db, all_pars, num_iter=num_iter)
+
+    # one task per worker, so every task is running before any finishes
+    workers = start_workers(db, len(all_pars))
+    while sweep_queue.status(db)['running'] < len(all_pars):
+        time.sleep(0.01)
+    con = sqlite3.connect(db)
+    victim = con.execute("SELECT sim_id FROM tasks WHERE worker = 'node-0'").fetchone()[0]
+    con.close()
+    workers[0].kill()
+
+    for p in workers[1:]:
+        p.join()
+        assert p.exitcode == 0
+    workers[0].join()
+
+    counts = sweep_queue.status(db)
+    print(counts)
+    assert counts['done'] == len(all_pars), counts
+    # the killed worker's task was taken over by one of the others
+    assert read_attempts(db)[victim] == 2
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_expired_leases(tmp)
+        check_killed_worker(tmp)
+    print('sweep queue ok')
+
+
+if __name__ == '__main__':
+    main()
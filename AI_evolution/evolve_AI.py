@@ -9,6 +9,7 @@
 
 # -----------------------------------------------------------------------------
 
+import itertools
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -155,3 +156,61 @@ def run_simulation(rho1, rho2, rho3, judge, reason, reinvest=False, num_iter=500
         i += 1
             
     return ai_complexity, reason
+
+
+# -----------------------------------------------------------------------------
+
+# columns of the sweep table, one row per run and iteration
+COLUMNS = ['sim_id', 'rho1', 'rho2', 'rho3', 'judge', 'reason',
+           'iter', 'c1', 'c2', 'c3', 'c4', 'c5',
+           'c6', 'c7', 'c8', 'c9', 'c10']
+
+def sweep_parameters(replicates=10):
+    """Parameter grid of run_AI_simulation.py: rho1-rho3 from 0.2 to 0.6
+    summing to 1, judge and reason from 0.2 to 1.
+
+    Args:
+        replicates (int, optional): runs per parameter combination. Defaults to 10.
+
+    Returns:
+        np.array: one row per run with sim_id, rho1, rho2, rho3, judge, reason.
+    """
+    rho1_range=rho2_range=rho3_range=np.arange(2, 7, 2)/10
+    judge_range=reason_range=np.arange(2, 11, 2)/10
+    par_combs = np.array(list(itertools.product(rho1_range, rho2_range,
+                                                rho3_range, judge_range,
+                                                reason_range)))
+    par_combs_sub = par_combs[(par_combs[:,0] + par_combs[:,1] + par_combs[:,2] == 1)]
+    all_pars = np.repeat(par_combs_sub, replicates, axis=0)
+    return np.hstack((np.arange(1, len(all_pars)+1).reshape(-1,1), all_pars))
+
+def fill_run_rows(rows, pars, sim):
+    """Writes one run into its rows of the sweep table (see COLUMNS).
+
+    Args:
+        rows (np.array): (num_iter, 17) block of the sweep table, filled in place.
+        pars (np.array): sim_id, rho1, rho2, rho3, judge, reason.
+        sim (np.array): (num_iter, 10) complexity measures from run_simulation.
+    """
+    rows[:, 0:6] = pars
+    rows[:, 6] = np.arange(0, len(rows))
+    rows[:, 7:] = sim
+
+def run_parameter_row(pars, reinvest=False, num_iter=500):
+    """Runs run_simulation for one row of the sweep parameters.
+
+    Args:
+        pars (np.array): sim_id, rho1, rho2, rho3, judge, reason.
+        reinvest (bool, optional): passed to run_simulation. Defaults to False.
+        num_iter (int, optional): Number of iterations. Defaults to 500.
+
+    Returns:
+        tuple: (num_iter, 10) complexity measures and the final reason.
+    """
+    return run_simulation(rho1 = pars[1],
+                          rho2 = pars[2],
+                          rho3 = pars[3],
+                          judge = pars[4],
+                          reason = pars[5],
+                          reinvest = bool(reinvest),
+                          num_iter = num_iter)
@@ -0,0 +1,360 @@
+# asyncio sweep driver that streams per-run summaries while the sweep runs
+
+# run_simulation calls are dispatched to a process pool. As each run finishes,
+# a small summary record (final utility, reason after reinvestment, trait
+# count, events/sec) is broadcast to subscribers, e.g. a JSON-lines file that
+# can be followed with `tail -f` or a local unix socket. The number of runs in
+# flight and the queue of every subscriber are bounded, so memory stays flat
+# however long the sweep is.
+#
+# usage (from the repository root):
+#   python -m AI_evolution.stream_sweep out.csv --jsonl progress.jsonl
+#   python -m AI_evolution.stream_sweep out.csv --socket /tmp/sweep.sock
+#   nc -U /tmp/sweep.sock        # watch from another terminal
+#
+# Ctrl+C (or --min-utility) stops dispatching new runs; the runs in flight
+# are drained and everything finished so far is written to out.csv. A second
+# Ctrl+C kills the runs in flight and writes out.csv right away.
+
+# -----------------------------------------------------------------------------
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+
+import numpy as np
+import pandas as pd
+
+from multiprocessing import Pool
+from AI_evolution.evolve_AI import (COLUMNS, fill_run_rows, run_parameter_row,
+                                    sweep_parameters)
+
+# -----------------------------------------------------------------------------
+
+def _timed_run(pars, reinvest, num_iter):
+    start = time.perf_counter()
+    sim, reason = run_parameter_row(pars, reinvest, num_iter)
+    return sim, reason, time.perf_counter() - start
+
+
+def summarise_run(pars, sim, reason, seconds):
+    """Summary record of one finished run.
+
+    Args:
+        pars (np.array): sim_id, rho1, rho2, rho3, judge, reason.
+        sim (np.array): (num_iter, 10) complexity measures.
+        reason (float): reason after reinvestment.
+        seconds (float): wall time of the run.
+
+    Returns:
+        dict: JSON-serialisable record.
+    """
+    return {'sim_id': int(pars[0]),
+            'rho1': float(pars[1]), 'rho2': float(pars[2]),
+            'rho3': float(pars[3]), 'judge': float(pars[4]),
+            'reason': float(pars[5]),
+            'final_reason': float(reason),
+            'final_max_utility': float(sim[-1, 7]),
+            'final_mean_utility': float(sim[-1, 9]),
+            'trait_number': int(sim[-1, 0]),
+            'seconds': seconds,
+            'events_per_sec': len(sim) / seconds if seconds > 0 else float('inf')}
+
+
+class Broadcaster:
+    """Fans records out to subscribers, each with its own bounded queue.
+
+    publish() waits while a subscriber's queue is full, which in turn stops
+    new runs from being dispatched (backpressure). Subscribers that may
+    disappear, such as socket clients, are registered with drop=True and lose
+    their oldest records instead of holding up the sweep.
+    """
+
+    def __init__(self):
+        self._queues = []
+
+    def subscribe(self, maxsize=1000, drop=False):
+        queue = asyncio.Queue(maxsize)
+        self._queues.append((queue, drop))
+        return queue
+
+    def unsubscribe(self, queue):
+        self._queues = [(q, d) for q, d in self._queues if q is not queue]
+
+    async def publish(self, record):
+        for queue, drop in list(self._queues):
+            if drop and queue.full():
+                queue.get_nowait()
+            await queue.put(record)
+
+    async def close(self):
+        # None tells subscribers the sweep is over
+        await self.publish(None)
+
+
+async def jsonl_writer(queue, path):
+    """Appends each record as one line to a JSON-lines file, flushing after
+    every line so that `tail -f` sees runs as they finish."""
+    with open(path, 'a') as f:
+        while (record := await queue.get()) is not None:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+
+
+async def socket_server(broadcaster, path, maxsize=100):
+    """Serves records as JSON lines on a unix socket, one bounded queue per
+    connected client.
+
+    Returns:
+        asyncio.Server: close it when the sweep is done.
+    """
+    async def handle(reader, writer):
+        queue = broadcaster.subscribe(maxsize, drop=True)
+        try:
+            while (record := await queue.get()) is not None:
+                writer.write((json.dumps(record) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            broadcaster.unsubscribe(queue)
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    return await asyncio.start_unix_server(handle, path)
+
+
+def stop_when_unproductive(min_utility, patience):
+    """should_stop callback for run_sweep: stops once the last `patience`
+    finished runs all ended with a mean utility below `min_utility`."""
+    below = 0
+
+    def should_stop(record):
+        nonlocal below
+        below = below + 1 if record['final_mean_utility'] < min_utility else 0
+        return below >= patience
+
+    return should_stop
+
+
+def _init_worker():
+    # forked workers share the parent's random state
+    np.random.seed()
+    # and asyncio's signal handling: a Ctrl+C sent to the whole process group
+    # would be written back into the parent's wakeup fd once per worker. Only
+    # the parent decides what to stop, workers end through Pool.terminate().
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _submit(pool, loop, fn, *args):
+    """Runs fn on the pool and returns an asyncio future for its result."""
+    future = loop.create_future()
+
+    def resolve(result=None, error=None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    pool.apply_async(fn, args,
+                     callback=lambda r: loop.call_soon_threadsafe(resolve, r),
+                     error_callback=lambda e: loop.call_soon_threadsafe(resolve, None, e))
+    return future
+
+
+async def _unless(event, awaitable):
+    """Awaits awaitable unless event is set first.
+
+    Returns:
+        bool: False if the event interrupted it (it is then cancelled).
+    """
+    task = asyncio.ensure_future(awaitable)
+    waiter = asyncio.ensure_future(event.wait())
+    await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    waiter.cancel()
+    if task.done():
+        return True
+    task.cancel()
+    await asyncio.wait({task})
+    # a gather cancelled through its children ends with an exception
+    if not task.cancelled():
+        task.exception()
+    return False
+
+
+async def run_sweep(all_pars, num_iter=500, reinvest=True, broadcaster=None,
+                    max_workers=None, max_in_flight=None, should_stop=None,
+                    stop=None, abort=None):
+    """Runs a parameter sweep on a process pool and publishes a summary record
+    for every finished run.
+
+    The sweep stops dispatching new runs when should_stop returns True, when
+    `stop` is set (e.g. from a signal handler) or when a run raises. Runs
+    already in flight are drained and everything finished so far is
+    returned. A failed run is published as a record with an 'error' key.
+    Setting `abort` terminates the workers instead of draining them.
+
+    Args:
+        all_pars (np.array): one row per run with sim_id, rho1, rho2, rho3,
+        judge, reason.
+        num_iter (int, optional): iterations per run. Defaults to 500.
+        reinvest (bool, optional): passed to run_simulation. Defaults to True.
+        broadcaster (Broadcaster, optional): receives the records. Defaults
+        to None.
+        max_workers (int, optional): worker processes. Defaults to all cores.
+        max_in_flight (int, optional): runs submitted but not yet consumed.
+        Defaults to twice the number of workers.
+        should_stop (callable, optional): called with every record, the sweep
+        stops once it returns True. Defaults to None.
+        stop (asyncio.Event, optional): set it to stop the sweep. Defaults
+        to None.
+        abort (asyncio.Event, optional): set it to kill the runs in flight.
+        Defaults to None.
+
+    Returns:
+        pd.DataFrame: sweep table (as run_AI_simulation.py) of all finished
+        runs, in order of sim_id. attrs['errors'] holds the error records of
+        failed runs.
+    """
+    loop = asyncio.get_running_loop()
+    max_workers = max_workers or os.cpu_count()
+    in_flight = asyncio.Semaphore(max_in_flight or 2 * max_workers)
+    ai_complex = np.zeros(shape = (num_iter * len(all_pars), len(COLUMNS)))
+    finished = np.zeros(len(all_pars), dtype=bool)
+    stop = stop or asyncio.Event()
+    abort = abort or asyncio.Event()
+    errors = []
+
+    async def one_run(i, pool):
+        try:
+            try:
+                sim, reason, seconds = await _submit(
+                    pool, loop, _timed_run, all_pars[i], reinvest, num_iter)
+            except Exception as e:
+                # stop dispatching, but keep the runs that did finish
+                record = {'sim_id': int(all_pars[i, 0]), 'error': repr(e)}
+                errors.append(record)
+                stop.set()
+            else:
+                fill_run_rows(ai_complex[i*num_iter:(i+1)*num_iter], all_pars[i], sim)
+                finished[i] = True
+                record = summarise_run(all_pars[i], sim, reason, seconds)
+                if should_stop is not None and should_stop(record):
+                    stop.set()
+            if broadcaster is not None:
+                await broadcaster.publish(record)
+        finally:
+            in_flight.release()
+
+    pool = Pool(max_workers, initializer=_init_worker)
+    tasks = []
+    drained = False
+    try:
+        for i in range(len(all_pars)):
+            if not await _unless(abort, in_flight.acquire()):
+                break
+            if stop.is_set():
+                in_flight.release()
+                break
+            tasks.append(asyncio.create_task(one_run(i, pool)))
+        # drain the runs in flight, unless aborted meanwhile
+        drained = await _unless(abort, asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+        # joining or killing the workers must not block the event loop
+        if drained:
+            pool.close()
+            await loop.run_in_executor(None, pool.join)
+        else:
+            await loop.run_in_executor(None, pool.terminate)
+        if broadcaster is not None:
+            await broadcaster.close()
+
+    ai_complex_df = pd.DataFrame(ai_complex[np.repeat(finished, num_iter)],
+                                 columns=COLUMNS)
+    ai_complex_df.attrs['errors'] = errors
+    return ai_complex_df
+
+
+# -----------------------------------------------------------------------------
+
+async def _main(args):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    abort = asyncio.Event()
+
+    def on_signal():
+        # first Ctrl+C drains the runs in flight, a second one kills them;
+        # either way everything finished so far is written
+        if not stop.is_set():
+            print('stopping: finishing runs in flight, Ctrl+C again to abort',
+                  flush=True)
+            stop.set()
+        elif not abort.is_set():
+            print('aborting: killing runs in flight', flush=True)
+            abort.set()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, on_signal)
+
+    should_stop = None
+    if args.min_utility is not None:
+        should_stop = stop_when_unproductive(args.min_utility, args.patience)
+
+    broadcaster = Broadcaster()
+    writers = []
+    server = None
+    if args.jsonl:
+        writers.append(asyncio.create_task(
+            jsonl_writer(broadcaster.subscribe(), args.jsonl)))
+    if args.socket:
+        server = await socket_server(broadcaster, args.socket)
+    try:
+        ai_complex_df = await run_sweep(sweep_parameters(args.replicates),
+                                        num_iter=args.num_iter,
+                                        reinvest=not args.no_reinvest,
+                                        broadcaster=broadcaster,
+                                        max_workers=args.workers,
+                                        should_stop=should_stop,
+                                        stop=stop, abort=abort)
+        await asyncio.gather(*writers)
+    finally:
+        if server is not None:
+            server.close()
+    ai_complex_df.to_csv(args.out, index=False)
+    print(f"{ai_complex_df['sim_id'].nunique()} runs written to {args.out}")
+    for record in ai_complex_df.attrs['errors']:
+        print(f"run {record['sim_id']} failed: {record['error']}")
+    if abort.is_set():
+        return 130
+    return 1 if ai_complex_df.attrs['errors'] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run an AI evolution sweep and stream per-run summaries')
+    parser.add_argument('out', help='csv for the full sweep table')
+    parser.add_argument('--jsonl', help='append run summaries to this file')
+    parser.add_argument('--socket', help='serve run summaries on this unix socket')
+    parser.add_argument('--num-iter', type=int, default=500)
+    parser.add_argument('--replicates', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-reinvest', action='store_true')
+    parser.add_argument('--min-utility', type=float, default=None,
+                        help='stop once --patience runs in a row end with a '
+                        'mean utility below this')
+    parser.add_argument('--patience', type=int, default=20)
+    return asyncio.run(_main(parser.parse_args(argv)))
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
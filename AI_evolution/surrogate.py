@@ -0,0 +1,249 @@
+# emulator of the parameter-to-outcome response of the AI evolution simulation
+
+# Fits Gaussian processes to the final complexity measures of a stored sweep
+# (e.g. ai_complex_df_rec.csv) so that the mean and replicate spread of c1-c10
+# at unsampled (rho1, rho2, rho3, judge, reason) points can be queried without
+# running new simulations. The predictive uncertainty of the emulator flags
+# points where real simulations are needed.
+
+# -----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from scipy.linalg import solve_triangular
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, RBF
+
+# -----------------------------------------------------------------------------
+
+PARAMETERS = ['rho1', 'rho2', 'rho3', 'judge', 'reason']
+MEASURES = ['c1', 'c2', 'c3', 'c4', 'c5', 'c6', 'c7', 'c8', 'c9', 'c10']
+# rho3 = 1 - rho1 - rho2 in every sweep, so it carries no information
+FEATURES = ['rho1', 'rho2', 'judge', 'reason']
+FEATURE_INDEX = [PARAMETERS.index(f) for f in FEATURES]
+
+
+def summarise_sweep(ai_complex_df, iteration=None):
+    """Mean and standard deviation of the complexity measures across
+    replicates of each parameter combination.
+
+    Args:
+        ai_complex_df (pd.DataFrame): sweep table with sim_id, parameters,
+        iter and c1-c10 (as written by run_AI_simulation.py).
+        iteration (int, optional): iteration to summarise. Defaults to None,
+        which uses the last row of each run, so runs of different length
+        are all kept.
+
+    Returns:
+        pd.DataFrame: one row per parameter combination with the parameters,
+        n (number of replicates), and <measure>_mean and <measure>_sd.
+    """
+    if iteration is None:
+        final = ai_complex_df.sort_values(['sim_id', 'iter']).groupby('sim_id').tail(1)
+    else:
+        final = ai_complex_df[ai_complex_df['iter'] == iteration]
+    # the grid is built from np.arange, round so that equal values group
+    keys = final[PARAMETERS].round(6)
+    grouped = final[MEASURES].groupby([keys[p] for p in PARAMETERS])
+    summary = grouped.agg(['mean', 'std'])
+    summary.columns = [f'{m}_{"sd" if s == "std" else s}' for m, s in summary.columns]
+    summary.insert(0, 'n', grouped.size())
+    # single replicates have no spread
+    return summary.fillna(0).reset_index()
+
+
+def _fit_gp(X, y, noise_var):
+    """Fits a noise-free RBF Gaussian process with known per-point noise on
+    standardised y and returns what prediction needs as plain arrays."""
+    y_mean, y_std = y.mean(), y.std() or 1.
+    kernel = ConstantKernel() * RBF(length_scale=np.ones(X.shape[1]),
+                                    length_scale_bounds=(1e-2, 1e3))
+    # the replicate noise of each point enters through alpha instead of a
+    # WhiteKernel, so the predictive std is the uncertainty about the mean
+    gp = GaussianProcessRegressor(kernel=kernel, n_restarts_optimizer=2,
+                                  alpha=noise_var / y_std**2 + 1e-8)
+    gp.fit(X, (y - y_mean) / y_std)
+    L_inv = solve_triangular(gp.L_, np.eye(len(X)), lower=True)
+    return (gp.kernel_.k1.constant_value, gp.kernel_.k2.length_scale,
+            gp.alpha_, L_inv, y_mean, y_std)
+
+
+def fit_emulator(summary, measures=MEASURES):
+    """Fits one Gaussian process to the replicate mean and one to the
+    replicate spread of each complexity measure.
+
+    Args:
+        summary (pd.DataFrame): output of summarise_sweep.
+        measures (list, optional): measures to emulate. Defaults to c1-c10.
+
+    Returns:
+        dict: fitted emulator. The kernels of all Gaussian processes are
+        stacked into arrays (arcsinh means first, then log spreads) so that predict
+        evaluates them together.
+    """
+    X = summary[FEATURES].to_numpy()
+    n = summary['n'].to_numpy()
+    # typical replicate spread of each measure
+    spread = np.array([summary[f'{m}_sd'].median() for m in measures])
+    scale = np.where(spread > 0, spread, 1.)
+    fits = []
+    for m, c in zip(measures, scale):
+        # utilities span several orders of magnitude across the grid, so the
+        # means are emulated on an arcsinh scale (linear within about one
+        # typical spread c of 0, logarithmic beyond). The mean of n
+        # replicates is known up to sd^2 / n, mapped by the delta method.
+        y = summary[f'{m}_mean'].to_numpy()
+        fits.append(_fit_gp(X, np.arcsinh(y / c),
+                            summary[f'{m}_sd'].to_numpy()**2 / n / (c**2 + y**2)))
+    for m in measures:
+        # spread is non-negative, emulate it on the log scale, where the
+        # sampling variance of a log sd is about 1 / (2 (n - 1))
+        fits.append(_fit_gp(X, np.log(summary[f'{m}_sd'].to_numpy() + 1e-6),
+                            1 / (2 * np.maximum(n - 1, 1))))
+    amplitude, length_scale, alpha, L_inv, y_mean, y_std = map(np.array, zip(*fits))
+    pars = summary[PARAMETERS].to_numpy()
+    # training inputs scaled by each gp's length scales, kept for predict
+    B = X[None, :, :] / length_scale[:, None, :]
+    return {'measures': list(measures),
+            'B_T': B.transpose(0, 2, 1).copy(), 'B_sq': np.sum(B**2, axis=-1)[:, None, :],
+            'amplitude': amplitude, 'length_scale': length_scale,
+            'alpha': alpha, 'L_inv': L_inv, 'y_mean': y_mean, 'y_std': y_std,
+            'low': pars.min(axis=0), 'high': pars.max(axis=0),
+            'scale': scale, 'spread': spread}
+
+
+def predict_array(emulator, X, tolerance=1., simplex_tol=1e-6):
+    """Array version of predict, without building a DataFrame.
+
+    Args:
+        emulator (dict): output of fit_emulator.
+        X (np.array): (n, 5) array of rho1, rho2, rho3, judge, reason.
+        tolerance (float, optional): see predict. Defaults to 1.
+        simplex_tol (float, optional): see predict. Defaults to 1e-6.
+
+    Returns:
+        tuple: (n, measures) arrays of mean, sd, se and needs_simulation
+        (boolean, per measure).
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    k = len(emulator['measures'])
+    # (gps, points, training points) kernel, with inputs scaled per gp
+    A = X[None, :, FEATURE_INDEX] / emulator['length_scale'][:, None, :]
+    sq_dist = np.sum(A**2, axis=-1)[:, :, None] + emulator['B_sq'] - 2 * A @ emulator['B_T']
+    K = emulator['amplitude'][:, None, None] * np.exp(-0.5 * np.clip(sq_dist, 0, None))
+    f = (K @ emulator['alpha'][:, :, None])[:, :, 0]
+    f = emulator['y_mean'][:, None] + emulator['y_std'][:, None] * f
+    scale = emulator['scale']
+    mean = scale * np.sinh(f[:k].T)
+    # undo the offset of the log, which can undershoot near zero spread
+    sd = np.clip(np.exp(f[k:].T) - 1e-6, 0, None)
+
+    # latent variance of the mean gps only: c - ||L^-1 k||^2
+    V = K[:k] @ emulator['L_inv'][:k].transpose(0, 2, 1)
+    var = emulator['amplitude'][:k, None] - np.sum(V**2, axis=-1)
+    se = (emulator['y_std'][:k, None] * np.sqrt(np.clip(var, 0, None))).T
+    # back from the arcsinh scale by the delta method
+    se = se * scale * np.cosh(f[:k].T)
+
+    # the engine is only defined for rho1 + rho2 + rho3 = 1, and extrapolation
+    # beyond the sampled box is never trusted
+    outside = np.abs(X[:, :3].sum(axis=1) - 1) > simplex_tol
+    outside |= np.any((X < emulator['low'] - simplex_tol) |
+                      (X > emulator['high'] + simplex_tol), axis=1)
+    # compare with the local spread, floored at a quarter of the typical
+    # spread so that regions where a measure saturates (sd near 0, e.g. c3
+    # once all seed traits are used) do not flag every point
+    floor = 0.25 * emulator['spread'] + 1e-9
+    needs_simulation = outside[:, None] | (se > tolerance * np.maximum(sd, floor))
+    return mean, sd, se, needs_simulation
+
+
+def predict(emulator, pars, tolerance=1., simplex_tol=1e-6):
+    """Predicts the mean and spread of the complexity measures at new
+    parameter combinations.
+
+    Args:
+        emulator (dict): output of fit_emulator.
+        pars (array-like): (n, 5) array or DataFrame of rho1, rho2, rho3,
+        judge, reason.
+        tolerance (float, optional): a point needs simulating when the
+        emulator's uncertainty about a mean (se) exceeds this fraction of
+        the predicted replicate spread (sd) at that point. With the default
+        of 1, a single new run would say more than the emulator. At a
+        sampled point with n replicates se is about sd / sqrt(n), so values
+        below 1 / sqrt(n) flag even the training points. Defaults to 1.
+        simplex_tol (float, optional): points whose rho1 + rho2 + rho3
+        differs from 1 by more than this need simulating. Defaults to 1e-6.
+
+    Returns:
+        pd.DataFrame: per point the parameters, <measure>_mean, <measure>_sd
+        (predicted spread across replicates), <measure>_se (uncertainty of
+        the emulator about the mean), <measure>_needs_simulation and
+        needs_simulation (any measure). Heavy-tailed measures such as c8
+        are the hardest to emulate, so select the flags of the measures
+        you need.
+    """
+    if isinstance(pars, pd.DataFrame):
+        pars = pars[PARAMETERS]
+    X = np.atleast_2d(np.asarray(pars, dtype=float))
+    mean, sd, se, needs_simulation = predict_array(emulator, X, tolerance,
+                                                   simplex_tol)
+    measures = emulator['measures']
+    out = pd.DataFrame(np.hstack((X, mean, sd, se)),
+                       columns=PARAMETERS + [f'{m}_mean' for m in measures] +
+                       [f'{m}_sd' for m in measures] +
+                       [f'{m}_se' for m in measures])
+    flags = pd.DataFrame(needs_simulation,
+                         columns=[f'{m}_needs_simulation' for m in measures])
+    out = pd.concat((out, flags), axis=1)
+    out['needs_simulation'] = needs_simulation.any(axis=1)
+    return out
+
+
+def sensitivity(emulator, measure, num_samples=2000, seed=None):
+    """Variance-based first-order sensitivity of a measure to each parameter,
+    estimated on emulator predictions over the sampled range. rho1-rho3 are
+    drawn summing to 1 as in the sweeps.
+
+    Args:
+        emulator (dict): output of fit_emulator.
+        measure (str): one of c1-c10.
+        num_samples (int, optional): emulator evaluations per parameter.
+        Defaults to 2000.
+        seed (int, optional): random seed. Defaults to None.
+
+    Returns:
+        pd.Series: share of the variance of the predicted mean explained by
+        each parameter.
+    """
+    rng = np.random.default_rng(seed)
+    low, high = emulator['low'], emulator['high']
+
+    def sample(n):
+        # draw rho1, rho2 and keep points whose rho3 = 1 - rho1 - rho2 is in range
+        X = np.zeros(shape = (0, len(PARAMETERS)))
+        while len(X) < n:
+            draw = rng.uniform(low, high, size=(n, len(PARAMETERS)))
+            draw[:, 2] = 1 - draw[:, 0] - draw[:, 1]
+            keep = (draw[:, 2] >= low[2]) & (draw[:, 2] <= high[2])
+            X = np.vstack((X, draw[keep]))
+        return X[:n]
+
+    j_measure = emulator['measures'].index(measure)
+
+    def mean_of(X):
+        return predict_array(emulator, X)[0][:, j_measure]
+
+    total = mean_of(sample(num_samples)).var()
+    # variance of the conditional mean, binning each parameter in turn
+    num_bins = 10
+    shares = {}
+    for j, p in enumerate(PARAMETERS):
+        X = sample(num_samples)
+        y = mean_of(X)
+        bins = np.quantile(X[:, j], np.linspace(0, 1, num_bins + 1)[1:-1])
+        idx = np.digitize(X[:, j], bins)
+        cond_means = np.array([y[idx == b].mean() for b in range(num_bins)])
+        shares[p] = cond_means.var() / total if total > 0 else 0.
+    return pd.Series(shares, name=measure)
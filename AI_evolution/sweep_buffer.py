@@ -0,0 +1,187 @@
+# shared result buffer for parallel parameter sweeps
+
+# Workers write their rows of the (num_runs * num_iter, 17) sweep table
+# straight into shared memory (or a memory-mapped file) instead of pickling
+# each complexity matrix back to the parent. The parent wraps the same block
+# of memory as a DataFrame, so the results are never copied.
+
+# -----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from multiprocessing import Pool, shared_memory
+from AI_evolution.evolve_AI import COLUMNS, fill_run_rows, run_parameter_row
+
+# -----------------------------------------------------------------------------
+
+
+class _SharedArray:
+    """Exposes a SharedMemory block to numpy through __array_interface__.
+
+    Arrays built on shm.buf only reference the memoryview, so closing the
+    SharedMemory would unmap the memory under them. Arrays built on this
+    object have it as their base instead, which keeps the block mapped for
+    as long as any view (including DataFrames) is alive, and closes it
+    after the last one is gone.
+    """
+
+    def __init__(self, shm, shape):
+        self.shm = shm
+        array = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        self.__array_interface__ = array.__array_interface__
+
+    def __del__(self):
+        self.shm.close()
+
+
+class ResultBuffer:
+    """Sweep result table backed by shared memory or a memory-mapped file.
+
+    The buffer is created once in the parent. Workers re-attach to it by name
+    (shared memory) or path (memory-mapped file) and write the rows of their
+    run in place.
+
+    Args:
+        num_runs (int): number of simulation runs in the sweep.
+        num_iter (int): number of iterations per run.
+        path (str, optional): file to memory-map. Defaults to None, which
+        uses an anonymous shared memory block.
+        name (str, optional): name of an existing shared memory block to
+        attach to. Defaults to None, which creates a new block.
+    """
+
+    def __init__(self, num_runs, num_iter, path=None, name=None):
+        self.num_runs = num_runs
+        self.num_iter = num_iter
+        self.path = path
+        shape = (num_runs * num_iter, len(COLUMNS))
+
+        if path is not None:
+            # only the creator truncates the file, workers open it r+
+            mode = 'r+' if name == path else 'w+'
+            self._shm = None
+            self.name = path
+            self.array = np.memmap(path, dtype=np.float64, mode=mode, shape=shape)
+        else:
+            nbytes = int(np.prod(shape)) * np.dtype(np.float64).itemsize
+            if name is None:
+                self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            else:
+                self._shm = shared_memory.SharedMemory(name=name)
+            self.name = self._shm.name
+            self.array = np.asarray(_SharedArray(self._shm, shape))
+        self._owner = name is None
+
+    def spec(self):
+        """Picklable description that lets a worker attach to the buffer.
+
+        Returns:
+            tuple: num_runs, num_iter, path and name of the buffer.
+        """
+        return self.num_runs, self.num_iter, self.path, self.name
+
+    @classmethod
+    def attach(cls, spec):
+        """Attaches to an existing buffer from its spec()."""
+        num_runs, num_iter, path, name = spec
+        return cls(num_runs, num_iter, path=path, name=name)
+
+    def run_rows(self, run):
+        """Zero-copy view of the rows belonging to one run.
+
+        Args:
+            run (int): index of the run (0-based row of all_pars).
+
+        Returns:
+            np.array: (num_iter, 17) view into the buffer.
+        """
+        return self.array[run * self.num_iter:(run + 1) * self.num_iter]
+
+    def write_run(self, run, pars, sim):
+        """Writes parameters, iteration numbers and complexity measures of a
+        run into its rows.
+
+        Args:
+            run (int): index of the run (0-based row of all_pars).
+            pars (np.array): sim_id, rho1, rho2, rho3, judge, reason.
+            sim (np.array): (num_iter, 10) complexity measures.
+        """
+        fill_run_rows(self.run_rows(run), pars, sim)
+
+    def to_dataframe(self):
+        """Wraps the buffer as a DataFrame without copying it. The DataFrame
+        stays readable after close() and keeps the memory alive until it is
+        garbage collected."""
+        return pd.DataFrame(self.array, columns=COLUMNS, copy=False)
+
+    def close(self):
+        """Detaches from the buffer. The creator also removes the shared
+        memory block, so no new worker can attach to it. Views handed out by
+        to_dataframe() and run_rows() remain valid."""
+        # drop our own view, callers may still hold theirs
+        self.array = None
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        # the mapping itself is closed by _SharedArray once no view is left
+        if self._owner:
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------------------------------------------------------
+
+# worker side: each process attaches to the buffer once
+_worker_buffer = None
+
+def _init_worker(spec):
+    global _worker_buffer
+    # forked workers share the parent's random state, so reseed from the OS
+    np.random.seed()
+    _worker_buffer = ResultBuffer.attach(spec)
+
+def _run_into_buffer(args):
+    run, pars, reinvest = args
+    sim, reason = run_parameter_row(pars, reinvest, _worker_buffer.num_iter)
+    _worker_buffer.write_run(run, pars, sim)
+    # only the final reason travels back through the pipe
+    return run, reason
+
+def run_sweep(all_pars, num_iter=500, reinvest=True, processes=None, path=None):
+    """Runs a parameter sweep in parallel, with workers writing their results
+    directly into a shared ResultBuffer.
+
+    Args:
+        all_pars (np.array): one row per run with sim_id, rho1, rho2, rho3,
+        judge, reason (as built in run_AI_simulation.py).
+        num_iter (int, optional): Number of iterations per run. Defaults to 500.
+        reinvest (bool, optional): passed to run_simulation. Defaults to True.
+        processes (int, optional): Number of worker processes. Defaults to
+        None (all cores).
+        path (str, optional): memory-map the results to this file instead of
+        using shared memory. Defaults to None.
+
+    Returns:
+        tuple: ResultBuffer with all runs (close it when done) and np.array
+        of the final reason of each run.
+    """
+    buffer = ResultBuffer(len(all_pars), num_iter, path=path)
+    final_reason = np.zeros(len(all_pars))
+    tasks = ((run, all_pars[run], reinvest) for run in range(len(all_pars)))
+    try:
+        with Pool(processes, initializer=_init_worker,
+                  initargs=(buffer.spec(),)) as pool:
+            for run, reason in pool.imap_unordered(_run_into_buffer, tasks):
+                final_reason[run] = reason
+    except BaseException:
+        buffer.close()
+        raise
+    if path is not None:
+        buffer.array.flush()
+    return buffer, final_reason
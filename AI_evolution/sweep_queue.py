@@ -0,0 +1,359 @@
+# SQLite work queue for running sweeps across several worker processes
+
+# A coordinator writes one task per parameter row into a SQLite file. Workers
+# claim tasks with a lease, run run_simulation and commit the complexity
+# matrix back into the same file. A worker keeps renewing its lease while the
+# run is going, so only tasks whose worker died lose their lease and are
+# handed out again.
+#
+# SQLite relies on file locking, which is unreliable on network filesystems
+# (NFS, SMB). Keep the database on a local disk; to use several machines, run
+# the workers on the machine that holds the file or give each machine its own
+# queue and merge the collected csv files.
+#
+# usage (from the repository root):
+#   python -m AI_evolution.sweep_queue init sweep.db --num-iter 500
+#   python -m AI_evolution.sweep_queue worker sweep.db      # start several
+#   python -m AI_evolution.sweep_queue status sweep.db
+#   python -m AI_evolution.sweep_queue collect sweep.db out.csv
+
+# -----------------------------------------------------------------------------
+
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from AI_evolution.evolve_AI import (COLUMNS, fill_run_rows, run_parameter_row,
+                                    sweep_parameters)
+
+# -----------------------------------------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    sim_id      INTEGER PRIMARY KEY,
+    rho1        REAL NOT NULL,
+    rho2        REAL NOT NULL,
+    rho3        REAL NOT NULL,
+    judge       REAL NOT NULL,
+    reason      REAL NOT NULL,
+    reinvest    INTEGER NOT NULL,
+    num_iter    INTEGER NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+CREATE TABLE IF NOT EXISTS results (
+    sim_id       INTEGER PRIMARY KEY REFERENCES tasks (sim_id),
+    complexity   BLOB NOT NULL,
+    final_reason REAL NOT NULL,
+    worker       TEXT NOT NULL,
+    seconds      REAL NOT NULL
+);
+"""
+
+
+def connect(path):
+    """Opens the queue database and makes sure the tables exist.
+
+    Args:
+        path (str): SQLite file shared by coordinator and workers.
+
+    Returns:
+        sqlite3.Connection: connection in autocommit mode.
+    """
+    # autocommit, transactions are opened explicitly with BEGIN IMMEDIATE
+    con = sqlite3.connect(path, timeout=60, isolation_level=None)
+    con.execute('PRAGMA busy_timeout = 60000')
+    # readers do not block the writer, keeps lock waits of heartbeats short
+    con.execute('PRAGMA journal_mode = WAL')
+    con.executescript(SCHEMA)
+    return con
+
+
+def enqueue(path, all_pars, num_iter=500, reinvest=True):
+    """Writes one task per parameter row. Rows whose sim_id is already in the
+    queue are left untouched, so a sweep can be extended or re-initialised.
+
+    Args:
+        path (str): queue database.
+        all_pars (np.array): rows of sim_id, rho1, rho2, rho3, judge, reason.
+        num_iter (int, optional): iterations per run. Defaults to 500.
+        reinvest (bool, optional): passed to run_simulation. Defaults to True.
+
+    Returns:
+        int: number of new tasks.
+    """
+    con = connect(path)
+    rows = [(int(p[0]), *map(float, p[1:6]), int(reinvest), num_iter)
+            for p in all_pars]
+    with con:
+        con.execute('BEGIN IMMEDIATE')
+        before = con.total_changes
+        con.executemany('INSERT OR IGNORE INTO tasks (sim_id, rho1, rho2, rho3, '
+                        'judge, reason, reinvest, num_iter) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        added = con.total_changes - before
+    con.close()
+    return added
+
+
+def claim(con, worker, lease=600, max_attempts=3):
+    """Claims the next pending task, or a running task whose lease has
+    expired.
+
+    Args:
+        con (sqlite3.Connection): queue connection.
+        worker (str): worker id stored with the lease.
+        lease (float, optional): seconds until the task may be handed out
+        again. Defaults to 600.
+        max_attempts (int, optional): tasks claimed this often are marked
+        failed instead of being retried. Defaults to 3.
+
+    Returns:
+        tuple: task row (sim_id, rho1, rho2, rho3, judge, reason, reinvest,
+        num_iter) or None if nothing is left to claim.
+    """
+    now = time.time()
+    with con:
+        con.execute('BEGIN IMMEDIATE')
+        # give up on tasks that keep losing their lease
+        con.execute("UPDATE tasks SET status = 'failed', "
+                    "error = COALESCE(error, 'lease expired') "
+                    "WHERE status = 'running' AND lease_until < ? "
+                    "AND attempts >= ?", (now, max_attempts))
+        task = con.execute("SELECT sim_id, rho1, rho2, rho3, judge, reason, "
+                           "reinvest, num_iter FROM tasks "
+                           "WHERE status = 'pending' "
+                           "OR (status = 'running' AND lease_until < ?) "
+                           "ORDER BY sim_id LIMIT 1", (now,)).fetchone()
+        if task is None:
+            return None
+        con.execute("UPDATE tasks SET status = 'running', worker = ?, "
+                    "lease_until = ?, attempts = attempts + 1 "
+                    "WHERE sim_id = ?", (worker, now + lease, task[0]))
+    return task
+
+
+def complete(con, worker, sim_id, sim, reason, seconds):
+    """Commits the result of a task, provided the worker still holds its
+    lease.
+
+    Returns:
+        bool: False if the lease was lost and the result was discarded.
+    """
+    with con:
+        con.execute('BEGIN IMMEDIATE')
+        owned = con.execute("UPDATE tasks SET status = 'done', lease_until = NULL "
+                            "WHERE sim_id = ? AND status = 'running' "
+                            "AND worker = ?", (sim_id, worker)).rowcount
+        if not owned:
+            return False
+        con.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                    (sim_id, np.ascontiguousarray(sim, dtype=np.float64).tobytes(),
+                     float(reason), worker, seconds))
+    return True
+
+
+def release(con, worker, sim_id, error, max_attempts=3):
+    """Puts a task that raised back into the queue, or marks it failed once it
+    has used up its attempts."""
+    with con:
+        con.execute('BEGIN IMMEDIATE')
+        con.execute("UPDATE tasks SET status = CASE WHEN attempts >= ? "
+                    "THEN 'failed' ELSE 'pending' END, "
+                    "lease_until = NULL, error = ? "
+                    "WHERE sim_id = ? AND worker = ?",
+                    (max_attempts, error, sim_id, worker))
+
+
+class Heartbeat(threading.Thread):
+    """Background thread that keeps extending the lease of a running task.
+
+    Uses its own connection, since sqlite3 connections must not be shared
+    between threads.
+
+    Args:
+        path (str): queue database.
+        worker (str): worker id holding the lease.
+        sim_id (int): task being run.
+        lease (float): lease length in seconds, renewed every lease / 4.
+    """
+
+    def __init__(self, path, worker, sim_id, lease):
+        super().__init__(daemon=True)
+        self.path = path
+        self.worker = worker
+        self.sim_id = sim_id
+        self.lease = lease
+        self._finished = threading.Event()
+
+    def run(self):
+        # the tables exist already, skip connect() and its schema statements
+        con = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        while not self._finished.wait(self.lease / 4):
+            with con:
+                con.execute('BEGIN IMMEDIATE')
+                con.execute("UPDATE tasks SET lease_until = ? "
+                            "WHERE sim_id = ? AND worker = ? "
+                            "AND status = 'running'",
+                            (time.time() + self.lease, self.sim_id, self.worker))
+        con.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._finished.set()
+        self.join()
+
+
+def next_expiry(con):
+    """Earliest lease_until of the running tasks.
+
+    Returns:
+        float: unix time, or None if no task is running.
+    """
+    return con.execute("SELECT MIN(lease_until) FROM tasks "
+                       "WHERE status = 'running'").fetchone()[0]
+
+
+def work(path, worker=None, lease=600, max_attempts=3, max_tasks=None):
+    """Worker loop: claims tasks and runs them until no task is pending or
+    running. While other workers still hold leases, it waits so that it can
+    take over their tasks if their leases run out.
+
+    Args:
+        path (str): queue database.
+        worker (str, optional): worker id. Defaults to hostname:pid.
+        lease (float, optional): lease length in seconds. It is renewed
+        while a run is going, so it only bounds how long a dead worker holds
+        on to its task. Defaults to 600.
+        max_attempts (int, optional): attempts per task. Defaults to 3.
+        max_tasks (int, optional): stop after this many tasks. Defaults to None.
+
+    Returns:
+        int: number of tasks completed by this worker.
+    """
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    # workers started together must not share a random state
+    np.random.seed()
+    con = connect(path)
+    done = 0
+    while max_tasks is None or done < max_tasks:
+        task = claim(con, worker, lease=lease, max_attempts=max_attempts)
+        if task is None:
+            # other workers may still die on their tasks: stay around until
+            # the earliest lease could expire, quit once nothing is running
+            expiry = next_expiry(con)
+            if expiry is None:
+                break
+            time.sleep(min(max(expiry - time.time(), 0) + 0.01, lease))
+            continue
+        sim_id, reinvest, num_iter = task[0], task[6], task[7]
+        start = time.perf_counter()
+        try:
+            with Heartbeat(path, worker, sim_id, lease):
+                sim, final_reason = run_parameter_row(task[:6], reinvest, num_iter)
+        except Exception as e:
+            release(con, worker, sim_id, repr(e), max_attempts)
+            continue
+        if complete(con, worker, sim_id, sim, final_reason,
+                    time.perf_counter() - start):
+            done += 1
+    con.close()
+    return done
+
+
+def status(path):
+    """Counts tasks per status.
+
+    Returns:
+        dict: status -> number of tasks, plus 'expired' for running tasks
+        whose lease has run out.
+    """
+    con = connect(path)
+    counts = dict.fromkeys(['pending', 'running', 'done', 'failed'], 0)
+    counts.update(con.execute('SELECT status, COUNT(*) FROM tasks '
+                              'GROUP BY status').fetchall())
+    counts['expired'] = con.execute("SELECT COUNT(*) FROM tasks WHERE "
+                                    "status = 'running' AND lease_until < ?",
+                                    (time.time(),)).fetchone()[0]
+    con.close()
+    return counts
+
+
+def collect(path):
+    """Builds the sweep table of run_AI_simulation.py from all finished tasks.
+
+    Returns:
+        pd.DataFrame: one row per run and iteration with COLUMNS.
+    """
+    con = connect(path)
+    rows = con.execute('SELECT t.sim_id, t.rho1, t.rho2, t.rho3, t.judge, '
+                       't.reason, t.num_iter, r.complexity FROM results r '
+                       'JOIN tasks t USING (sim_id) ORDER BY t.sim_id').fetchall()
+    con.close()
+    num_rows = sum(row[6] for row in rows)
+    ai_complex = np.zeros(shape = (num_rows, len(COLUMNS)))
+    start = 0
+    for *pars, num_iter, blob in rows:
+        sim = np.frombuffer(blob, dtype=np.float64).reshape(num_iter, 10)
+        fill_run_rows(ai_complex[start:start + num_iter], pars, sim)
+        start += num_iter
+    return pd.DataFrame(ai_complex, columns=COLUMNS)
+
+
+# -----------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='SQLite work queue for AI evolution sweeps')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('init', help='write the sweep parameters as tasks')
+    p.add_argument('db')
+    p.add_argument('--num-iter', type=int, default=500)
+    p.add_argument('--replicates', type=int, default=10)
+    p.add_argument('--no-reinvest', action='store_true')
+
+    p = sub.add_parser('worker', help='claim and run tasks until none are left')
+    p.add_argument('db')
+    p.add_argument('--lease', type=float, default=600)
+    p.add_argument('--max-attempts', type=int, default=3)
+    p.add_argument('--max-tasks', type=int, default=None)
+
+    p = sub.add_parser('status', help='show number of tasks per status')
+    p.add_argument('db')
+
+    p = sub.add_parser('collect', help='write finished runs to csv')
+    p.add_argument('db')
+    p.add_argument('csv')
+
+    args = parser.parse_args(argv)
+    if args.command == 'init':
+        added = enqueue(args.db, sweep_parameters(args.replicates),
+                        num_iter=args.num_iter, reinvest=not args.no_reinvest)
+        print(f'{added} tasks added')
+    elif args.command == 'worker':
+        done = work(args.db, lease=args.lease, max_attempts=args.max_attempts,
+                    max_tasks=args.max_tasks)
+        print(f'{done} tasks completed')
+    elif args.command == 'status':
+        for key, value in status(args.db).items():
+            print(f'{key:>8}: {value}')
+    elif args.command == 'collect':
+        collect(args.db).to_csv(args.csv, index=False)
+
+
+if __name__ == '__main__':
+    main()